@@ -30,15 +30,15 @@ Version: 2.0
 
 import pandas as pd
 import numpy as np
-import os
 import re
-import glob
-import zipfile
 import warnings
 from pathlib import Path
 from datetime import datetime
 
-warnings.filterwarnings('ignore')
+# Only silence openpyxl's style noise from the Excel sources; pandas
+# warnings (dtype fallbacks, future behavior changes) should stay visible
+# so slow object-dtype paths don't hide behind a blanket ignore
+warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
 
 # ============================================================================
 # CONFIGURATION
@@ -47,6 +47,7 @@ warnings.filterwarnings('ignore')
 # Base paths
 DATA_DIR = Path("Data")
 OUTPUT_FILE = DATA_DIR / "unified_resilience_dataset.csv"
+PARQUET_FILE = DATA_DIR / "unified_resilience_dataset.parquet"
 COVERAGE_FILE = DATA_DIR / "coverage_matrix.csv"
 VALIDATION_FILE = DATA_DIR / "validation_report.txt"
 
@@ -341,14 +342,15 @@ try:
                 if col in emdat_df.columns:
                     emdat_df[col] = pd.to_numeric(emdat_df[col], errors='coerce').fillna(0)
             
-            # Count events by country-year
-            event_counts = emdat_df.groupby(['iso3', 'year']).size().reset_index(name='emdat_event_count')
-            
+            # Group by country-year once; the grouper (key hashing + index
+            # mapping) is reused for both the event count and the sums
+            emdat_grouped = emdat_df.groupby(['iso3', 'year'])
+            event_counts = emdat_grouped.size().reset_index(name='emdat_event_count')
+
             # Aggregate numeric columns by country-year
             agg_cols = [c for c in numeric_cols if c in emdat_df.columns]
             if agg_cols:
-                agg_dict = {col: 'sum' for col in agg_cols}
-                emdat_agg = emdat_df.groupby(['iso3', 'year'], as_index=False)[agg_cols].sum()
+                emdat_agg = emdat_grouped[agg_cols].sum().reset_index()
                 emdat_agg = emdat_agg.merge(event_counts, on=['iso3', 'year'], how='left')
             else:
                 emdat_agg = event_counts
@@ -434,13 +436,15 @@ try:
         gdacs_combined = gdacs_combined[(gdacs_combined['year'] >= YEAR_START) & 
                                          (gdacs_combined['year'] <= YEAR_END)]
         
-        # Create severity weight from alert level
+        # Create severity weight from alert level (uppercase once, derive all
+        # three columns from the same series)
         alert_weights = {'GREEN': 1, 'ORANGE': 2, 'RED': 3}
-        gdacs_combined['severity_weight'] = gdacs_combined['alertlevel'].str.upper().map(alert_weights).fillna(1)
-        
+        alert_upper = gdacs_combined['alertlevel'].str.upper()
+        gdacs_combined['severity_weight'] = alert_upper.map(alert_weights).fillna(1)
+
         # Count by alert level
-        gdacs_combined['is_red_alert'] = (gdacs_combined['alertlevel'].str.upper() == 'RED').astype(int)
-        gdacs_combined['is_orange_alert'] = (gdacs_combined['alertlevel'].str.upper() == 'ORANGE').astype(int)
+        gdacs_combined['is_red_alert'] = (alert_upper == 'RED').astype(int)
+        gdacs_combined['is_orange_alert'] = (alert_upper == 'ORANGE').astype(int)
         
         # Aggregate by country-year
         gdacs_agg = gdacs_combined.groupby(['iso3', 'year']).agg({
@@ -529,12 +533,15 @@ try:
         weo_long['value'] = pd.to_numeric(weo_long['value'], errors='coerce')
         weo_long['year'] = weo_long['year'].astype(int)
         
-        # Pivot to wide format
-        weo_pivot = weo_long.pivot_table(
-            index=['iso3', 'year'],
-            columns='indicator',
-            values='value'
-        ).reset_index()
+        # Pivot to wide format (groupby+unstack skips pivot_table's
+        # aggfunc dispatch and margin machinery for the same mean)
+        weo_pivot = (
+            weo_long.groupby(['iso3', 'year', 'indicator'])['value']
+            .mean()
+            .unstack('indicator')
+            .dropna(how='all')
+            .reset_index()
+        )
         
         # Rename columns
         weo_pivot.columns.name = None
@@ -610,11 +617,15 @@ try:
         'FP.CPI.TOTL.ZG': 'inflation_wdi',
     }
     
-    # Read in chunks to handle large file
+    # Read in chunks to handle large file. Only the key columns and the
+    # target-range years are needed, so skip tokenizing the country/indicator
+    # name columns and the ~40 year columns before YEAR_START
+    wdi_usecols = {'Country Code', 'Indicator Code'} | {str(y) for y in range(YEAR_START, YEAR_END + 1)}
     chunks = []
     chunk_size = 50000
-    
-    for chunk in pd.read_csv(wdi_file, chunksize=chunk_size, low_memory=False):
+
+    for chunk in pd.read_csv(wdi_file, chunksize=chunk_size, low_memory=False,
+                             usecols=lambda c: c in wdi_usecols):
         # Filter for target indicators
         filtered = chunk[chunk['Indicator Code'].isin(target_wdi_indicators)]
         if len(filtered) > 0:
@@ -639,11 +650,13 @@ try:
         wdi_long['value'] = pd.to_numeric(wdi_long['value'], errors='coerce')
         
         # Pivot to wide format
-        wdi_pivot = wdi_long.pivot_table(
-            index=['Country Code', 'year'],
-            columns='Indicator Code',
-            values='value'
-        ).reset_index()
+        wdi_pivot = (
+            wdi_long.groupby(['Country Code', 'year', 'Indicator Code'])['value']
+            .mean()
+            .unstack('Indicator Code')
+            .dropna(how='all')
+            .reset_index()
+        )
         
         wdi_pivot.columns.name = None
         wdi_pivot = wdi_pivot.rename(columns={'Country Code': 'iso3'})
@@ -798,11 +811,13 @@ try:
         wgi_df['estimate'] = pd.to_numeric(wgi_df['estimate'], errors='coerce')
         
         # Pivot indicators to columns
-        wgi_pivot = wgi_df.pivot_table(
-            index=['iso3', 'year'],
-            columns='indicator',
-            values='estimate'
-        ).reset_index()
+        wgi_pivot = (
+            wgi_df.groupby(['iso3', 'year', 'indicator'])['estimate']
+            .mean()
+            .unstack('indicator')
+            .dropna(how='all')
+            .reset_index()
+        )
         
         wgi_pivot.columns.name = None
         
@@ -924,17 +939,19 @@ try:
                     df_clean = df[['destLocations', 'budgetYear', 'amountUSD']].copy()
                     df_clean = df_clean.dropna(subset=['destLocations', 'amountUSD'])
                     
-                    # Handle multi-country destinations (split equally)
+                    # Handle multi-country destinations (split equally);
+                    # itertuples yields plain tuples instead of building a
+                    # Series per row like iterrows
                     expanded_rows = []
-                    for _, row in df_clean.iterrows():
-                        locations = str(row['destLocations']).split(',')
+                    for dest, budget_year, amount in df_clean[['destLocations', 'budgetYear', 'amountUSD']].itertuples(index=False, name=None):
+                        locations = str(dest).split(',')
                         locations = [loc.strip() for loc in locations if loc.strip() and len(loc.strip()) == 3]
                         if locations:
-                            amount_per_country = row['amountUSD'] / len(locations)
+                            amount_per_country = amount / len(locations)
                             for loc in locations:
                                 expanded_rows.append({
                                     'iso3': loc,
-                                    'year': row['budgetYear'],
+                                    'year': budget_year,
                                     'funding_usd': amount_per_country
                                 })
                     
@@ -1261,6 +1278,13 @@ for df, name in merge_datasets:
     else:
         print(f"   ○ Skipped {name}: Empty or missing key columns")
 
+# Everything the source frames held now lives in `final`; release them so
+# the post-processing steps don't compete with 13 dead frames for memory
+del merge_datasets, df
+del (ndgain_final, ntl_final, emdat_final, gdacs_final, weo_final, wdi_final,
+     hdr_final, wgi_final, inform_final, fts_final, desinventar_final,
+     barrolee_final, gini_final)
+
 # ============================================================================
 # POST-PROCESSING & DATA QUALITY IMPROVEMENTS
 # ============================================================================
@@ -1277,6 +1301,13 @@ final = final.dropna(subset=['iso3'])
 # Sort by iso3 and year
 final = final.sort_values(['iso3', 'year']).reset_index(drop=True)
 
+# Years fit comfortably in int16; int64 wastes 6 bytes per row. iso3 is
+# ~200 repeated 3-char codes, so store it as category — the later
+# per-country groupbys then work on integer codes (this matches the
+# dtypes run_diagnostics uses when loading the CSV)
+final['year'] = final['year'].astype('int16')
+final['iso3'] = final['iso3'].astype('category')
+
 print(f"\n1. Basic filtering complete: {len(final)} rows")
 
 # ============================================================================
@@ -1539,8 +1570,10 @@ try:
         'YEM': 'Asia', 'ZMB': 'Africa', 'ZWE': 'Africa', 'HKG': 'Asia', 'MAC': 'Asia',
     }
     
-    final['region'] = final['iso3'].map(region_mapping)
-    
+    # Store as category: a handful of region labels repeated across every
+    # country-year row
+    final['region'] = final['iso3'].map(region_mapping).astype('category')
+
     # Add income classification based on GDP per capita
     gdp_col = 'gdp_per_capita_best' if 'gdp_per_capita_best' in final.columns else 'gdp_per_capita'
     if gdp_col in final.columns:
@@ -1567,9 +1600,12 @@ print(f"   Countries: {final['iso3'].nunique()}")
 print(f"   Year range: {final['year'].min()} - {final['year'].max()}")
 print(f"   Total country-years: {len(final)}")
 
-# Column coverage analysis
+# Column coverage analysis — count nulls once and derive every coverage
+# figure below (summary, coverage matrix, full column list) from it
+null_counts = final.isnull().sum()
+
 print(f"\n📈 COLUMN COVERAGE (% non-null values):")
-coverage = (1 - final.isnull().sum() / len(final)) * 100
+coverage = (1 - null_counts / len(final)) * 100
 coverage_sorted = coverage.sort_values(ascending=False)
 
 # Group by coverage level
@@ -1595,8 +1631,8 @@ for col, pct in low_coverage.head(10).items():
 print(f"\n📐 DERIVED INDICES COVERAGE:")
 for idx in ['DII', 'RRS', 'CRI', 'DII_normalized', 'RRS_normalized', 'CRI_normalized']:
     if idx in final.columns:
-        idx_coverage = (final[idx].notna().sum() / len(final)) * 100
-        print(f"   {idx}: {idx_coverage:.1f}% ({final[idx].notna().sum()} values)")
+        idx_count = final[idx].notna().sum()
+        print(f"   {idx}: {(idx_count / len(final)) * 100:.1f}% ({idx_count} values)")
 
 # Validate ISO3 codes
 print(f"\n🌍 ISO3 CODE VALIDATION:")
@@ -1617,7 +1653,7 @@ except:
 # Regional distribution
 if 'region' in final.columns:
     print(f"\n🗺️ REGIONAL DISTRIBUTION:")
-    region_counts = final.groupby('region')['iso3'].nunique()
+    region_counts = final.groupby('region', observed=True)['iso3'].nunique()
     for region, count in region_counts.sort_values(ascending=False).items():
         print(f"   {region}: {count} countries")
 
@@ -1625,7 +1661,7 @@ if 'region' in final.columns:
 coverage_df = pd.DataFrame({
     'column': coverage.index,
     'coverage_pct': coverage.values,
-    'non_null_count': (len(final) - final.isnull().sum()).values
+    'non_null_count': (len(final) - null_counts).values
 })
 coverage_df = coverage_df.sort_values('coverage_pct', ascending=False)
 coverage_df.to_csv(COVERAGE_FILE, index=False)
@@ -1641,22 +1677,41 @@ print("=" * 80)
 # Reorder columns for better usability
 key_cols = ['iso3', 'year', 'region', 'income_group']
 index_cols = ['DII', 'DII_normalized', 'RRS', 'RRS_normalized', 'CRI', 'CRI_normalized']
-disaster_cols = [c for c in final.columns if any(x in c for x in ['disaster', 'deaths', 'affected', 'emdat', 'gdacs', 'desinventar'])]
-economic_cols = [c for c in final.columns if any(x in c for x in ['gdp', 'gini', 'inflation', 'population', 'income'])]
-development_cols = [c for c in final.columns if any(x in c for x in ['hdi', 'life_expectancy', 'education', 'schooling', 'literacy', 'health'])]
-governance_cols = [c for c in final.columns if 'wgi' in c]
-resilience_cols = [c for c in final.columns if any(x in c for x in ['ndgain', 'inform', 'ntl'])]
-funding_cols = [c for c in final.columns if 'funding' in c or 'fts' in c]
+
+# Bucket the remaining columns by category in a single pass over the
+# column list instead of running a separate substring scan per category
+category_substrings = [
+    ('disaster', ['disaster', 'deaths', 'affected', 'emdat', 'gdacs', 'desinventar']),
+    ('economic', ['gdp', 'gini', 'inflation', 'population', 'income']),
+    ('development', ['hdi', 'life_expectancy', 'education', 'schooling', 'literacy', 'health']),
+    ('governance', ['wgi']),
+    ('resilience', ['ndgain', 'inform', 'ntl']),
+    ('funding', ['funding', 'fts']),
+]
+buckets = {name: [] for name, _ in category_substrings}
+for col in final.columns:
+    for name, substrings in category_substrings:
+        if any(x in col for x in substrings):
+            buckets[name].append(col)
+
+disaster_cols = buckets['disaster']
+economic_cols = buckets['economic']
+development_cols = buckets['development']
+governance_cols = buckets['governance']
+resilience_cols = buckets['resilience']
+funding_cols = buckets['funding']
 
 # Get all other columns
-all_ordered = key_cols + index_cols + disaster_cols + economic_cols + development_cols + governance_cols + resilience_cols + funding_cols
+all_ordered = set(key_cols + index_cols + disaster_cols + economic_cols + development_cols + governance_cols + resilience_cols + funding_cols)
 other_cols = [c for c in final.columns if c not in all_ordered]
 
 # Create final column order (remove duplicates while preserving order)
 final_col_order = []
+seen = set()
 for col in key_cols + index_cols + disaster_cols + economic_cols + development_cols + governance_cols + resilience_cols + funding_cols + other_cols:
-    if col in final.columns and col not in final_col_order:
+    if col in final.columns and col not in seen:
         final_col_order.append(col)
+        seen.add(col)
 
 # Reorder and save
 final = final[final_col_order]
@@ -1668,7 +1723,18 @@ print(f"   File size: {OUTPUT_FILE.stat().st_size / (1024*1024):.2f} MB")
 print(f"   Columns: {len(final.columns)}")
 print(f"   Rows: {len(final)}")
 
+# Also write a Parquet sidecar: columnar and typed, so downstream scripts
+# can load it without re-tokenizing the CSV
+try:
+    final.to_parquet(PARQUET_FILE)
+    print(f"✓ Saved Parquet sidecar to: {PARQUET_FILE}")
+except ImportError:
+    print("   (pyarrow not installed; skipped Parquet sidecar)")
+
 # Generate validation report
+# One aggregation pass over the three indices instead of four reductions
+# per index in the f-string below
+index_stats = final[['DII', 'RRS', 'CRI']].agg(['count', 'min', 'max', 'mean'])
 validation_report = f"""
 ================================================================================
 GLOBAL DISASTER RESILIENCE ANALYTICS - DATA VALIDATION REPORT
@@ -1686,19 +1752,19 @@ Year Range: {final['year'].min()} - {final['year'].max()}
 DERIVED INDICES
 ---------------
 DII (Disaster Impact Index):
-  - Coverage: {(final['DII'].notna().sum() / len(final) * 100):.1f}%
-  - Range: {final['DII'].min():.4f} - {final['DII'].max():.4f}
-  - Mean: {final['DII'].mean():.4f}
+  - Coverage: {(index_stats.loc['count', 'DII'] / len(final) * 100):.1f}%
+  - Range: {index_stats.loc['min', 'DII']:.4f} - {index_stats.loc['max', 'DII']:.4f}
+  - Mean: {index_stats.loc['mean', 'DII']:.4f}
 
 RRS (Resilience Recovery Score):
-  - Coverage: {(final['RRS'].notna().sum() / len(final) * 100):.1f}%
-  - Range: {final['RRS'].min():.4f} - {final['RRS'].max():.4f}
-  - Mean: {final['RRS'].mean():.4f}
+  - Coverage: {(index_stats.loc['count', 'RRS'] / len(final) * 100):.1f}%
+  - Range: {index_stats.loc['min', 'RRS']:.4f} - {index_stats.loc['max', 'RRS']:.4f}
+  - Mean: {index_stats.loc['mean', 'RRS']:.4f}
 
 CRI (Composite Resilience Index):
-  - Coverage: {(final['CRI'].notna().sum() / len(final) * 100):.1f}%
-  - Range: {final['CRI'].min():.4f} - {final['CRI'].max():.4f}
-  - Mean: {final['CRI'].mean():.4f}
+  - Coverage: {(index_stats.loc['count', 'CRI'] / len(final) * 100):.1f}%
+  - Range: {index_stats.loc['min', 'CRI']:.4f} - {index_stats.loc['max', 'CRI']:.4f}
+  - Mean: {index_stats.loc['mean', 'CRI']:.4f}
 
 DATA SOURCES INTEGRATED
 -----------------------
@@ -1739,12 +1805,25 @@ with open(VALIDATION_FILE, 'w') as f:
     f.write(validation_report)
 print(f"✓ Saved validation report to: {VALIDATION_FILE}")
 
-# Print column list for reference
+# Print column list for reference — build the block once and emit it with
+# a single write instead of ~100 print calls
 print(f"\n📋 FULL COLUMN LIST ({len(final.columns)} columns):")
 print("-" * 60)
-for i, col in enumerate(final.columns, 1):
-    coverage_val = (1 - final[col].isnull().sum() / len(final)) * 100
-    print(f"   {i:2}. {col}: {coverage_val:.1f}%")
+print("\n".join(
+    f"   {i:2}. {col}: {coverage[col]:.1f}%"
+    for i, col in enumerate(final.columns, 1)
+))
+
+# ============================================================================
+# DATA QUALITY DIAGNOSTICS
+# ============================================================================
+# Hand the in-memory frame to the diagnostics module so it does not have to
+# re-parse the multi-MB CSV we just wrote
+try:
+    from run_diagnostics import run_diagnostics
+    run_diagnostics(final)
+except Exception as e:
+    print(f"   Warning: diagnostics step failed: {e}")
 
 print("\n" + "=" * 80)
 print("✅ PIPELINE COMPLETE")
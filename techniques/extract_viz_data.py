@@ -8,6 +8,9 @@ import re
 import csv
 from pathlib import Path
 
+# Pattern to match BibTeX entries, compiled once at import
+ENTRY_RE = re.compile(r'@(\w+)\{([^,]+),([^@]*?)(?=\n@|\Z)', re.DOTALL)
+
 def clean_latex(text):
     """Clean LaTeX commands and formatting from text."""
     if not text:
@@ -39,16 +42,13 @@ def parse_bibtex_file(filepath):
     with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
         content = f.read()
     
-    # Pattern to match BibTeX entries
-    entry_pattern = r'@(\w+)\{([^,]+),([^@]*?)(?=\n@|\Z)'
-    
     entries = []
-    matches = re.findall(entry_pattern, content, re.DOTALL)
-    
-    for match in matches:
-        entry_type = match[0].upper()  # ARTICLE, INPROCEEDINGS, PATENT, etc.
-        citation_key = match[1].strip()  # e.g., Aborisade2010
-        fields_text = match[2]
+    # finditer streams matches one at a time instead of materializing the
+    # full list of match tuples up front
+    for match in ENTRY_RE.finditer(content):
+        entry_type = match.group(1).upper()  # ARTICLE, INPROCEEDINGS, PATENT, etc.
+        citation_key = match.group(2).strip()  # e.g., Aborisade2010
+        fields_text = match.group(3)
         
         # Extract all useful fields
         author = extract_field(fields_text, 'author')